@@ -1,8 +1,11 @@
 import os
 from pathlib import Path
 import csv
-import json
-from collections import defaultdict
+import numpy as np
+import orjson
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from sklearn.model_selection import train_test_split
 
 # ====== CONFIGURATION ======
@@ -32,162 +35,194 @@ DataCols = [
 # Domain selection priority: we'll pick the first non-empty field from this list as the 'domain'
 DOMAIN_PRIORITY = ["occupation_domain", "job_category"]
 
-def read_csv_rows(csv_path: Path):
+# Columns passed (in this order) to to_jsonl_item for each row
+ITEM_COLS = [
+    "path", "duration", "text", "speaker_id",
+    "primary_language", "native_place_state", "gender",
+] + DOMAIN_PRIORITY
+
+# How many encoded JSONL lines to buffer before flushing them to disk in one write
+JSONL_FLUSH_EVERY = 65536
+
+def read_csv_rows(csv_path: Path) -> pd.DataFrame:
     """
-    Read the CSV file at `csv_path` and return its rows as a list of dictionaries.
-    Each dictionary contains metadata for one audio file, where the keys are the column names.
+    Read the CSV file at `csv_path` and return it as a DataFrame of strings.
+    The file is parsed by Arrow's multi-threaded C CSV reader instead of building one dict per row in Python.
+    Every column is read as text (no type inference), empty cells stay "" and missing columns are added as "".
+    Quoted values may contain newlines (csv.writer writes them for multi-line transcriptions).
+    Unlike csv.DictReader, a row with fewer or more fields than the header is an error instead of being padded;
+    the exporter always writes complete rows.
     """
-    rows = []
+    # Read only the header line, so every column can be declared as a string column up front
     with csv_path.open("r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f)  # csv.DictReader reads each row as a dictionary
-        for r in reader:
-            rows.append(r)  # Append each row to the list of rows
-    return rows
-
-def make_speaker_ids(rows):
+        header = next(csv.reader(f), [])
+    if not header:
+        return pd.DataFrame(columns=["path"] + DataCols)
+
+    table = pacsv.read_csv(
+        str(csv_path),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(column_types={c: pa.string() for c in header}),
+    )
+    df = table.to_pandas()
+
+    # The exported manifest lists "duration" twice; like csv.DictReader, the last column with a given name wins
+    df = df.loc[:, ~df.columns.duplicated(keep="last")]
+    return df.reindex(columns=["path"] + DataCols, fill_value="")
+
+def make_speaker_ids(df: pd.DataFrame):
     """
     Generate synthetic speaker IDs based on the combination of language (l1), state, and gender.
     This is useful when the dataset does not include a true speaker ID, but we want stable IDs for each unique speaker.
     """
-    ctr = defaultdict(int)  # A defaultdict to count occurrences of each (l1, state, gender) combination
-    spk_list = []  # List to store generated speaker IDs
+    # Extract primary language, state, and gender for each row
+    # Empty values default to "UNK" (language/state) and "U" (Unknown gender)
+    l1 = df["primary_language"].str.strip().replace("", "UNK")
+    st = df["native_place_state"].str.strip().replace("", "UNK")
+    gd = df["gender"].str.strip().replace("", "U")
 
-    for r in rows:
-        # Extract primary language, state, and gender for each row
-        l1 = (r.get("primary_language") or "").strip() or "UNK"  # Default to "UNK" if missing
-        st = (r.get("native_place_state") or "").strip() or "UNK"
-        gd = (r.get("gender") or "").strip() or "U"  # Default gender to "U" (Unknown)
+    # Number each row within its (language, state, gender) combination: 1, 2, 3, ...
+    # groupby + cumcount does the counting in C instead of a Python loop over a counter dict
+    ctr = pd.DataFrame({"l1": l1, "st": st, "gd": gd}).groupby(["l1", "st", "gd"], sort=False).cumcount() + 1
 
-        # Create a key based on (language, state, gender)
-        key = (l1, st, gd)
-        ctr[key] += 1  # Increment the counter for this combination
+    # Create a unique speaker ID in the format "SPK_<language>_<state>_<counter>"
+    spk = "SPK_" + l1 + "_" + st + "_" + ctr.astype(str).str.zfill(4)
+    return spk.tolist()
 
-        # Create a unique speaker ID in the format "SPK_<language>_<state>_<counter>"
-        spk = f"SPK_{l1}_{st}_{ctr[key]:04d}"
-        spk_list.append(spk)  # Append the speaker ID to the list
-
-    return spk_list
-
-def pick_domain(r):
+def pick_domain(domain_values):
     """
-    Pick the domain for each sample based on the first available field in DOMAIN_PRIORITY.
-    If both fields are empty, it returns "general".
+    Pick the domain for each sample: the first non-empty value of the DOMAIN_PRIORITY fields (given in that order).
+    If all fields are empty, it returns "general".
     """
-    for c in DOMAIN_PRIORITY:
-        v = r.get(c, "")  # Check if the field is not empty
-        if v:
+    for v in domain_values:
+        if v:  # Check if the field is not empty
             return v  # Return the first non-empty domain
     return "general"  # Return "general" if no domain is found
 
-def to_jsonl_item(r, speaker_id):
+def to_jsonl_item(path, duration, text, speaker_id, l1, state, gender, *domain_values):
     """
-    Convert the metadata of each row into a format suitable for JSONL.
+    Convert the metadata of one row (the values of ITEM_COLS, in order) into a format suitable for JSONL.
     Each dictionary corresponds to a single audio sample with relevant metadata (file path, speaker ID, transcription, etc.)
     """
     return {
-        "audio_filepath": r["path"],  # Path to the audio file
-        "duration": float(r["duration"]) if r.get("duration") else None,  # Duration of the audio sample
-        "text": r.get("text", ""),  # The transcription of the audio
+        "audio_filepath": path,  # Path to the audio file
+        "duration": float(duration) if duration else None,  # Duration of the audio sample
+        "text": text,  # The transcription of the audio
         "speaker_id": speaker_id,  # The unique speaker ID
-        "l1": r.get("primary_language", ""),  # The primary language of the speaker
-        "state": r.get("native_place_state", ""),  # The state of the speaker
-        "gender": r.get("gender", ""),  # The gender of the speaker
-        "domain": pick_domain(r),  # The domain (occupation/job category) of the speaker
+        "l1": l1,  # The primary language of the speaker
+        "state": state,  # The state of the speaker
+        "gender": gender,  # The gender of the speaker
+        "domain": pick_domain(domain_values),  # The domain (occupation/job category) of the speaker
     }
 
+def to_jsonl_items(df: pd.DataFrame):
+    """
+    Convert every row of `df` into a JSONL item. `df` must already have a "speaker_id" column.
+    Rows are read as plain tuples of ITEM_COLS, so no per-row dict is built just to look fields up again.
+    """
+    return [to_jsonl_item(*t) for t in df[ITEM_COLS].itertuples(index=False, name=None)]
+
 def write_jsonl(path: Path, items):
     """
     Write a list of JSONL items (dictionaries) to a `.jsonl` file. Each item is written on a new line in the file.
+    Items are encoded with orjson (UTF-8, non-ASCII kept as-is like ensure_ascii=False) into one buffer,
+    which is written in large chunks instead of one write call per line.
     """
     path.parent.mkdir(parents=True, exist_ok=True)  # Ensure the output directory exists
-    with path.open("w", encoding="utf-8") as w:
-        for it in items:
-            w.write(json.dumps(it, ensure_ascii=False) + "\n")  # Write each item as a JSON line
-
-def main():
-    # 1) Read data from the CSV file and convert it into a list of dictionaries
-    rows = read_csv_rows(CSV_PATH)
-    if not rows:
-        raise SystemExit(f"No rows found in {CSV_PATH}")  # Exit if the CSV is empty
+    # Bind the encoder and buffer method to locals, and let orjson append the newline in C
+    dumps = orjson.dumps
+    opt = orjson.OPT_APPEND_NEWLINE
+    buf = bytearray()
+    extend = buf.extend
+    with path.open("wb") as w:
+        for n, it in enumerate(items, 1):
+            extend(dumps(it, option=opt))
+            if n % JSONL_FLUSH_EVERY == 0:  # Keep memory bounded on very large splits
+                w.write(buf)
+                buf.clear()
+        w.write(buf)
+
+def run_split(csv_path: Path, out_dir: Path, test_size: float, dev_frac: float, make_splits: bool):
+    """
+    Build the JSONL manifests from the CSV at `csv_path` and write them to `out_dir`.
+    With `make_splits`, speakers are split into train/dev/test (`test_size` of speakers for test, `dev_frac` of the rest for dev);
+    otherwise every row goes into a single test.jsonl.
+    """
+    # 1) Read data from the CSV file into a DataFrame
+    df = read_csv_rows(csv_path)
+    if df.empty:
+        raise SystemExit(f"No rows found in {csv_path}")  # Exit if the CSV is empty
 
     # 2) Generate synthetic speaker IDs for each row
-    spk_ids = make_speaker_ids(rows)
-
-    # 3) Convert the data into a JSONL-compatible format
-    items = [to_jsonl_item(r, spk) for r, spk in zip(rows, spk_ids)]
+    df["speaker_id"] = make_speaker_ids(df)
 
-    # 4) If we only want a single test.jsonl file, write it
-    if not Make_Splits:
-        write_jsonl(OUT_DIR / "test.jsonl", items)  # Write all data to a single test.jsonl file
-        print(f"✅ Wrote {len(items)} items to {OUT_DIR/'test.jsonl'}")
+    # 3) If we only want a single test.jsonl file, convert all rows to JSONL items and write them
+    if not make_splits:
+        items = to_jsonl_items(df)
+        write_jsonl(out_dir / "test.jsonl", items)  # Write all data to a single test.jsonl file
+        print(f"✅ Wrote {len(items)} items to {out_dir/'test.jsonl'}")
         return
 
     # ===== Stratify the splits based on speaker IDs =====
-    # Group the items by speaker ID to prevent data leakage (no overlap of speakers between splits)
-    by_spk = defaultdict(list)
-    for it in items:
-        by_spk[it["speaker_id"]].append(it)
-
-    spk_groups = list(by_spk.values())  # List of groups of items by speaker ID
+    # Split speakers, not rows, to prevent data leakage (no overlap of speakers between splits)
+    # One row per speaker (in order of first appearance), labelled by (language, state) of its first row
+    df["l1_state"] = df["primary_language"] + "|" + df["native_place_state"]
+    speakers = df.drop_duplicates("speaker_id")
+    spk_names = speakers["speaker_id"].to_numpy()
+    y = speakers["l1_state"].to_numpy()  # Stratification label for each speaker
 
-    # Define the stratification label based on (language, state)
-    def label(group):
-        it = group[0]  # Use the first item in the group as the label
-        return f"{it.get('l1','')}|{it.get('state','')}"
+    # The splits work on integer speaker indices instead of lists of item dicts
+    spk_idx = np.arange(len(spk_names))
 
-    y = [label(g) for g in spk_groups]  # List of labels for each group
-
-    # Split the data into test and rest sets using stratification
+    # Split the speakers into test and rest sets using stratification
     try:
-        rest_groups, test_groups = train_test_split(
-            spk_groups, test_size=Test_size, random_state=42, stratify=y
+        rest_i, test_i = train_test_split(
+            spk_idx, test_size=test_size, random_state=42, stratify=y
         )
     except ValueError:
-        rest_groups, test_groups = train_test_split(
-            spk_groups, test_size=Test_size, random_state=42
+        rest_i, test_i = train_test_split(
+            spk_idx, test_size=test_size, random_state=42
         )
 
-    # Split the remaining data into train and dev sets
-    y_rest = [label(g) for g in rest_groups]
+    # Split the remaining speakers into train and dev sets
+    y_rest = y[rest_i]
     try:
-        train_groups, dev_groups = train_test_split(
-            rest_groups,
-            test_size=Validation_Rest,
+        train_i, dev_i = train_test_split(
+            rest_i,
+            test_size=dev_frac,
             random_state=42,
             stratify=y_rest if len(set(y_rest)) > 1 else None,
         )
     except ValueError:
-        train_groups, dev_groups = train_test_split(
-            rest_groups, test_size=Validation_Rest, random_state=42
+        train_i, dev_i = train_test_split(
+            rest_i, test_size=dev_frac, random_state=42
         )
 
-    # Flatten the groups into individual items (for train, dev, and test)
-    def flatten(groups):
-        for g in groups:
-            for it in g:
-                yield it
-
-    train_items = list(flatten(train_groups))
-    dev_items   = list(flatten(dev_groups))
-    test_items  = list(flatten(test_groups))
-
-    # 5) Write the split data to JSONL files
-    write_jsonl(OUT_DIR / "train.jsonl", train_items)
-    write_jsonl(OUT_DIR / "dev.jsonl", dev_items)
-    write_jsonl(OUT_DIR / "test.jsonl", test_items)
-
-    # 6) Report the counts of items in each split
-    def counts(items):
-        from collections import Counter
-        c = Counter((it.get("l1",""), it.get("state","")) for it in items)
-        return sum(1 for _ in items), dict(c.most_common(10))
-
-    ntr, _ = counts(train_items)
-    ndv, _ = counts(dev_items)
-    nts, _ = counts(test_items)
-
-    print(f"Wrote splits to {OUT_DIR}")
-    print(f"  train: {ntr}  | dev: {ndv} | test: {nts}")
+    # Row positions of every speaker, from a single hash-based groupby pass
+    spk_rows = df.groupby("speaker_id", sort=False).indices
+
+    # Select the rows of the given speakers, speaker by speaker, in split order
+    def rows_of(split_i):
+        parts = [spk_rows[spk] for spk in spk_names[split_i]]
+        return df.iloc[np.concatenate(parts)] if parts else df.iloc[:0]
+
+    splits = {
+        "train": rows_of(train_i),
+        "dev": rows_of(dev_i),
+        "test": rows_of(test_i),
+    }
+
+    # 4) Write the split data to JSONL files
+    # Each split's dicts are built right before writing it, so only one split's items are in memory at a time
+    for name, split_df in splits.items():
+        write_jsonl(out_dir / f"{name}.jsonl", to_jsonl_items(split_df))
+
+    # 5) Report the counts of items in each split
+    print(f"Wrote splits to {out_dir}")
+    print(f"  train: {len(splits['train'])}  | dev: {len(splits['dev'])} | test: {len(splits['test'])}")
+
+def main():
+    run_split(CSV_PATH, OUT_DIR, Test_size, Validation_Rest, Make_Splits)
 
 if __name__ == "__main__":
     main()
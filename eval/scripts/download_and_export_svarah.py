@@ -1,12 +1,17 @@
 import os
 from pathlib import Path
 import io # for in-memory byte streams
+import csv # for writing the manifest
+from collections import deque # for the bounded window of pending tasks
+from itertools import islice # for cutting the rows into chunks
+from concurrent.futures import ProcessPoolExecutor # for exporting rows in parallel
+import multiprocessing as mp
 import numpy as np 
 import soundfile as sf # for reading/writing audio files
 from tqdm import tqdm # progress bar
 from datasets import load_dataset, Audio # for loading datasets and audio
-import librosa # for high-quality audio resampling
-# librosa is good for resqampling and is used in many ASR projects
+import soxr # for high-quality audio resampling
+# soxr (libsoxr) is a fast C resampler, and what librosa itself uses by default now
 
 # Set the path to the needed directories
 ParquetDataDir = Path("data/raw/Svarah/data")
@@ -20,6 +25,24 @@ TARGET_SR = 16000
 # Does not matter here because there is only one split in the Parquet files for Svarah (Hugging Face Datasets)
 SPLIT = "train"  
 
+# Number of worker processes used for the export (resampling is CPU-bound, so one per core)
+NUM_WORKERS = os.cpu_count()
+
+# Number of dataset rows read from the Parquet-backed dataset at a time
+READ_BATCH_SIZE = 256
+
+# Number of consecutive rows one worker task exports end to end
+EXPORT_CHUNK_SIZE = 32
+
+# Maximum number of chunks submitted to the workers but not yet written out
+# Keeps every worker busy (one chunk running, one queued) while only
+# MAX_PENDING * EXPORT_CHUNK_SIZE rows' audio bytes are held in memory
+MAX_PENDING = NUM_WORKERS * 2
+
+# Manifest output buffering: file buffer size and how many rows to collect per writerows call
+MANIFEST_BUFFER_BYTES = 1 << 20
+MANIFEST_FLUSH_ROWS = 4096
+
 # Columns in the file 
 DataCols = [
     "text", "gender", "age-group", "primary_language",
@@ -28,16 +51,21 @@ DataCols = [
     "duration"  
 ]
 
+# Metadata columns written after path, duration and text (computed once, not per row)
+META_COLS = [c for c in DataCols if c != "text"]
+
 
 def make_mono(x: np.ndarray) -> np.ndarray:
     """Make audio mono by averaging channels if needed."""
     
-    # tqdm.write because the progress bar is then not messed up
-    tqdm.write(f"Before Mono: Channels={x.ndim}")
+    # Ensure x is a float32 NumPy array, in a single conversion
+    # Because soundfile may return lists or other types (no copy if it is already float32)
+    x = np.asarray(x, dtype=np.float32)
+    
+    # Already mono (most Svarah clips): nothing to average
+    if x.ndim == 1:
+        return x
     
-    # Ensure x is a NumPy array
-    # Because soundfile may return lists or other types
-    x = np.asarray(x)
     if x.ndim == 2:  # if stereo
         
         # After reading audio, a stereo (or multi‑channel) signal can come in either shape:
@@ -52,30 +80,158 @@ def make_mono(x: np.ndarray) -> np.ndarray:
             
             # Average across channels (axis 0) to make mono
             # For example, if shape is (2, 48000), mean(axis=0) gives (48000,)
-            x = x.mean(axis=0)
+            # dtype=np.float32 keeps the sum in float32 too, so the result needs no cast afterwards
+            x = x.mean(axis=0, dtype=np.float32)
             
         else:  # (samples, channels)
             
             # Average across channels (axis 1) to make mono
             # For example, if shape is (48000, 2), mean(axis=1) gives (48000,)
-            x = x.mean(axis=1)
+            x = x.mean(axis=1, dtype=np.float32)
             
-    # tqdm.write because the progress bar is then not messed up                
-    tqdm.write(f"After Mono: Channels={x.ndim}")
-    return x.astype(np.float32, copy=False)
+    return x
 
-def csv_escape(val):
-    """Escape a value for CSV output, handling quotes and None."""
+def to_pcm16(x: np.ndarray) -> np.ndarray:
+    """Convert float audio to 16-bit PCM samples, the same way libsndfile does for PCM_16."""
     
-    # If the value is None, return an empty string
-    if val is None:
-        return ""
+    # Scale by 32768 and round down, exactly as libsndfile (1.2, bundled with soundfile) converts
+    # float to PCM_16, so 16-bit sources come back bit-exact
+    # Then saturate to the int16 range [-32768, 32767], like libsndfile with clipping on (soundfile's default)
+    # Done in place, so only one float buffer and the int16 result are allocated
+    pcm = x * 32768.0
+    np.floor(pcm, out=pcm)
+    np.clip(pcm, -32768, 32767, out=pcm)
+    return pcm.astype(np.int16)
+
+def iter_rows(ds, batch_size):
+    """Yield the rows of the dataset as dicts, reading it in batches of batch_size rows."""
     
-    # Convert the value to string
-    s = str(val)
+    # ds.iter reads whole column slices from the Arrow table at once, instead of
+    # building one Python dict per row access like ds[i] does.
+    # The "arrow" format hands back each batch as a pyarrow Table without going through
+    # the datasets Python formatter; to_pylist then builds the row dicts in one call.
+    # With Audio(decode=False) the audio column stays a plain {"bytes", "path"} struct.
+    for batch in ds.with_format("arrow").iter(batch_size=batch_size):
+        yield from batch.to_pylist()
+
+
+def iter_chunks(rows, chunk_size):
+    """Group rows into (index of the first row, list of rows) chunks of chunk_size rows."""
     
-    # Escape double quotes by doubling them, and wrap the whole string in double quotes
-    return '"' + s.replace('"', '""') + '"'
+    rows = iter(rows)
+    start = 0
+    while chunk := list(islice(rows, chunk_size)):
+        yield start, chunk
+        start += len(chunk)
+
+
+def map_bounded(ex, fn, arg_tuples, max_pending):
+    """Like ex.map(fn, ...), but read the inputs lazily and keep at most max_pending tasks in flight."""
+    
+    # Executor.map submits every input before returning, which would pull the whole dataset
+    # (audio bytes included) into memory. Results are yielded in input order.
+    pending = deque()
+    for args in arg_tuples:
+        pending.append(ex.submit(fn, *args))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def process_row(i, row):
+    """Decode, make mono, resample and write the audio of one row, and return its manifest fields."""
+    
+    # Runs in a worker process, so it only uses its arguments and module-level settings
+    
+    # Access the audio data from the row 
+    # Sepeated into variable 'a' for clarity and easier debugging
+    a = row["audio_filepath"]  
+    
+    # wav_data will hold the actual audio samples as a NumPy array
+    wav_data = None
+    
+    # sr will hold the sample rate of the audio
+    sr = None  
+    
+    # "a" is expected dict that contains metadata about the audio
+    # It may contain 'path' (where it is stored) 
+    # and/or 'bytes' (the actual in-memory audio data)
+    # Checks if "a" is a dict 
+    # Checks if "a" contains a key named 'path'
+    # and if the path exists on disk
+    if isinstance(a, dict) and a.get("path") and os.path.exists(a["path"]):
+       
+        # Read from path on disk
+        # False so that audio data is not forced into two dimensions when reading stereo files
+        # Because we handle mono/stereo ourselves
+        # dtype="float32" makes libsndfile decode straight to float32 (no float64 array + extra cast)
+        wav_data, sr = sf.read(a["path"], always_2d=False, dtype="float32")
+        
+    # If 'a' is a dict and contains 'bytes' (the actual in-memory audio data), read from in-memory bytes
+    elif isinstance(a, dict) and a.get("bytes"):
+        
+        # Read from bytes (in-memory)
+        # BytesIO is a Python class that allows binary data (in-memory bytes) to be treated like a file. 
+        # By wrapping the audio bytes in BytesIO, we can pass it to soundfile.read as if it were a file.
+        bio = io.BytesIO(a["bytes"])
+        
+        # Read the audio data and sample rate from the in-memory bytes
+        # False so that audio data is not forced into two dimensions when reading stereo files
+        # Because we handle mono/stereo ourselves   
+        # dtype="float32" makes libsndfile decode straight to float32 (no float64 array + extra cast)
+        wav_data, sr = sf.read(bio, always_2d=False, dtype="float32")
+    
+    # If neither is found, raise an error indicating that no audio source was provided.
+    else:
+        raise FileNotFoundError(
+            f"Row {i}: audio has neither a valid local path nor bytes. Got: {a}"
+        )
+    
+    # Make mono if needed
+    wav_data = make_mono(wav_data)
+    
+    # Resample to TARGET_SR if specified
+    if TARGET_SR is not None and sr != TARGET_SR:
+        # Same output length as librosa.resample: ceil(samples * TARGET_SR / sr),
+        # padding with zeros or trimming soxr's (rounded) output to match
+        n_out = int(np.ceil(len(wav_data) * float(TARGET_SR) / sr))
+        wav_data = soxr.resample(wav_data, sr, TARGET_SR, quality="HQ")
+        if len(wav_data) < n_out:
+            wav_data = np.pad(wav_data, (0, n_out - len(wav_data)))
+        wav_data = wav_data[:n_out]
+        sr = TARGET_SR
+    
+    # Save the processed audio as a WAV file in the output directory
+    # Use 16-bit PCM format for compatibility with most ASR tools
+    # The samples are already int16, so buffer_write hands the raw buffer to libsndfile
+    # without any float conversion or array reshaping on the way
+    # i:08d gives zero-padded filenames like 00000001.wav. Here, 8 because we may have many files.
+    out_wav = OutputDataDir / f"{i:08d}.wav"
+    with sf.SoundFile(str(out_wav), "w", samplerate=sr, channels=1, subtype="PCM_16") as out_file:
+        out_file.buffer_write(to_pcm16(wav_data), dtype="int16")
+    
+    # Duration from sample count
+    duration_sec = len(wav_data) / float(sr)
+    
+    # Build the manifest row with required fields
+    # Quoting/escaping is left to csv.writer in main(), which writes None as an empty field
+    # Start with path, duration, and text
+    text_val = row.get("text", "")
+    
+    # as_posix() gives a consistent path format with forward slashes
+    # which is generally preferred in CSVs and cross-platform
+    # .3f formats duration to 3 decimal places
+    # Then add the other metadata columns if they exist in the row
+    return [out_wav.as_posix(), f"{duration_sec:.3f}", text_val, *(row.get(c, "") for c in META_COLS)]
+
+
+def process_chunk(start, rows):
+    """Export a chunk of consecutive rows in one worker task, and return their manifest fields in order."""
+    
+    # One task per chunk instead of per row: each worker runs the whole pipeline for its rows,
+    # and the submit/pickle round trip is paid once per chunk
+    return [process_row(start + k, row) for k, row in enumerate(rows)]
 
 
 def main():
@@ -108,111 +264,49 @@ def main():
     # Write the header to the manifest file
     # 'w' mode to overwrite if it exists
     # utf-8 ensures all Unicode characters in later text (e.g. accents) are preserved.
-    with open(manifest_path, "w", encoding="utf-8") as manifest_file:
+    # A 1 MiB buffer means the many short rows reach the disk in a few large writes
+    with open(manifest_path, "w", encoding="utf-8", newline="", buffering=MANIFEST_BUFFER_BYTES) as manifest_file:
+        
+        # csv.writer quotes fields (and doubles quotes) only where needed, in C
+        # lineterminator="\n" keeps the same line endings as before
+        writer = csv.writer(manifest_file, quoting=csv.QUOTE_MINIMAL, lineterminator="\n")
         
         # Name the header rows in the manifest file
         # Keep the order: path, duration, text, then other metadata columns
         # Guarantees "text" is always 3rd—many ASR loaders expect that position
-        header = ["path", "duration", "text"]+ [c for c in DataCols if c not in ("text",)]
-        manifest_file.write(",".join(header) + "\n")
+        header = ["path", "duration", "text"] + META_COLS
+        writer.writerow(header)
         
         
-        # tqdm progress bar for visual feedback during processing
-        # Pattern: tqdm(iterable, desc="label")
-        for i in tqdm(range(len(ds)), desc=f"Exporting {SPLIT}"):
+        # Each row is independent (decode -> mono -> resample -> write), so chunks of rows are
+        # spread over worker processes. The byte-only Audio column keeps the pickled rows cheap.
+        # map_bounded yields chunk results in input order, so the manifest order matches the dataset order.
+        # "spawn" starts clean workers instead of forking a process that holds the dataset's Arrow
+        # memory maps and threads (and matches the default on Windows/macOS).
+        with ProcessPoolExecutor(max_workers=NUM_WORKERS, mp_context=mp.get_context("spawn")) as ex:
             
-            # Get the current row from the dataset
-            # row = the whole record (all columns) for item i.
-            # Access audio data from the row, for example: text, gender, etc.
-            row = ds[i]
+            chunks = iter_chunks(iter_rows(ds, READ_BATCH_SIZE), EXPORT_CHUNK_SIZE)
+            results = map_bounded(ex, process_chunk, chunks, MAX_PENDING)
+            rows = []
             
-            # Access the audio data from the row 
-            # Sepeated into variable 'a' for clarity and easier debugging
-            a = row["audio_filepath"]  
+            # tqdm progress bar for visual feedback during processing, advanced by one chunk at a time
+            # Pattern: tqdm(total=count, desc="label")
+            with tqdm(total=len(ds), desc=f"Exporting {SPLIT}") as pbar:
+                for chunk_fields in results:
+                    
+                    # Collect the chunk's rows and write collected rows to the manifest file in chunks
+                    rows.extend(chunk_fields)
+                    pbar.update(len(chunk_fields))
+                    if len(rows) >= MANIFEST_FLUSH_ROWS:
+                        writer.writerows(rows)
+                        rows.clear()
             
-            # wav_data will hold the actual audio samples as a NumPy array
-            wav_data = None
-            
-            # sr will hold the sample rate of the audio
-            sr = None  
-            
-            # "a" is expected dict that contains metadata about the audio
-            # It may contain 'path' (where it is stored) 
-            # and/or 'bytes' (the actual in-memory audio data)
-            # Checks if "a" is a dict 
-            # Checks if "a" contains a key named 'path'
-            # and if the path exists on disk
-            if isinstance(a, dict) and a.get("path") and os.path.exists(a["path"]):
-               
-                # Read from path on disk
-                # False so that audio data is not forced into two dimensions when reading stereo files
-                # Because we handle mono/stereo ourselves
-                data, sr = sf.read(a["path"], always_2d=False)
-                
-                # Convert to NumPy array of type float32 for consistency
-                wav_data = np.asarray(data, dtype=np.float32)
-                
-            # If 'a' is a dict and contains 'bytes' (the actual in-memory audio data), read from in-memory bytes
-            elif isinstance(a, dict) and a.get("bytes"):
-                
-                # Read from bytes (in-memory)
-                # BytesIO is a Python class that allows binary data (in-memory bytes) to be treated like a file. 
-                # By wrapping the audio bytes in BytesIO, we can pass it to soundfile.read as if it were a file.
-                bio = io.BytesIO(a["bytes"])
-                
-                # Read the audio data and sample rate from the in-memory bytes
-                # False so that audio data is not forced into two dimensions when reading stereo files
-                # Because we handle mono/stereo ourselves   
-                data, sr = sf.read(bio, always_2d=False)
-                
-                # Convert to NumPy array of type float32 for consistency
-                wav_data = np.asarray(data, dtype=np.float32)
-            
-            # If neither is found, raise an error indicating that no audio source was provided.
-            else:
-                raise FileNotFoundError(
-                    f"Row {i}: audio has neither a valid local path nor bytes. Got: {a}"
-                )
-            
-            # Make mono if needed
-            wav_data = make_mono(wav_data)
-            
-            # Resample to TARGET_SR if specified
-            if TARGET_SR is not None and sr != TARGET_SR:
-                wav_data = librosa.resample(wav_data, orig_sr=sr, target_sr=TARGET_SR)
-                sr = TARGET_SR
-            # tqdm.write because the progress bar is then not messed up    
-            tqdm.write(f"Resampled to {sr} Hz")
-            
-            # Save the processed audio as a WAV file in the output directory
-            # Use 16-bit PCM format for compatibility with most ASR tools
-            # i:08d gives zero-padded filenames like 00000001.wav. Here, 8 because we may have many files.
-            out_wav = OutputDataDir / f"{i:08d}.wav"
-            sf.write(str(out_wav), wav_data, sr, subtype="PCM_16")
-            
-            # Duration from sample count
-            duration_sec = len(wav_data) / float(sr)
-            
-            # Build the manifest row with required fields
-            # Start with path, duration, and text
-            text_val = row.get("text", "")
-            
-            # as_posix() gives a consistent path format with forward slashes
-            # which is generally preferred in CSVs and cross-platform
-            # .3f formats duration to 3 decimal places
-            fields = [out_wav.as_posix(), f"{duration_sec:.3f}", csv_escape(text_val)]
-            
-            # Add other metadata columns if they exist in the row
-            for c in DataCols:
-                if c == "text":
-                    continue              
-                # 
-                fields.append(csv_escape(row.get(c, "")))
-            # Write the row to the manifest file
-            manifest_file.write(",".join(fields) + "\n")
-    
-    print(f"\nDone!!!  \nWAVs in: {OutputDataDir}")
+            # Write the rows left over after the last full chunk
+            writer.writerows(rows)
+    
+    # One summary line instead of per-row output from the workers
+    print(f"\nDone!!!  Exported {len(ds)} files  \nWAVs in: {OutputDataDir}")
     print(f"Manifest: {manifest_path}")
     
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()